@@ -1,10 +1,17 @@
 import os
+import re
 import json
+import time
+import sqlite3
 import asyncio
 import logging
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import aiohttp
+import xxhash
+from aiolimiter import AsyncLimiter
 from telegram import Update
 from telegram.ext import (
     Application,
@@ -14,6 +21,32 @@ from telegram.ext import (
 )
 from dotenv import load_dotenv
 
+try:
+    import apprise
+except ImportError:
+    apprise = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Fastest available JSON parser / serializer, used for Steam API responses.
+# json_dumps always returns bytes so its output can be hashed directly.
+if orjson is not None:
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+else:
+    json_loads = json.loads
+    
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -27,42 +60,215 @@ logger = logging.getLogger(__name__)
 # Configuration from environment variables
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', '3600'))  # Default: 1 hour
-DATA_FILE = os.getenv('DATA_FILE', 'watched_games.json')
+DATA_FILE = os.getenv('DATA_FILE', 'watched_games.json')  # Legacy JSON data, imported once
+DB_FILE = os.getenv('DB_FILE', os.path.splitext(DATA_FILE)[0] + '.db')
 
 # Supported currencies
 CURRENCIES = ['us', 'gb', 'eu', 'ru', 'br', 'au', 'jp', 'in', 'ca', 'cn']
 
+# Maximum number of Steam API requests in flight at once
+MAX_CONCURRENT_REQUESTS = 10
+
+# Number of apps whose prices are fetched in a single appdetails request
+APPDETAILS_BATCH_SIZE = 10
+
+# Steam's store API allows roughly 200 requests per 5 minutes
+STEAM_RATE_LIMIT = 200
+STEAM_RATE_PERIOD = 300
+
+# Retry rate limited or failed Steam API requests with exponential backoff
+MAX_RETRIES = 3
+RETRY_STATUSES = (429, 500, 502, 503)
+
+# Telegram allows ~30 messages per second per bot, stay one under
+TELEGRAM_RATE_LIMIT = 29
+
+# Number of tasks delivering Telegram/Apprise notifications concurrently
+NOTIFICATION_WORKERS = 4
+
+# How long shutdown waits for queued notifications to be delivered
+NOTIFICATION_DRAIN_TIMEOUT = 30
+
+# How long a Steam API response is reused, kept well below the check interval
+PRICE_CACHE_TTL = min(300, CHECK_INTERVAL // 2)
+
+# How long a Steam API response is kept around to detect unchanged bodies
+PRICE_CACHE_RETENTION = CHECK_INTERVAL * 2
+
+# SQLite schema for watched games and per-user Apprise endpoints
+DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    chat_id TEXT NOT NULL,
+    app_id TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    last_price_cents INTEGER,
+    last_discount INTEGER,
+    game_name TEXT,
+    last_body_hash TEXT,
+    added_at TEXT,
+    PRIMARY KEY (chat_id, app_id, currency)
+);
+CREATE TABLE IF NOT EXISTS apprise_urls (
+    chat_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (chat_id, url)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Returned by request_appdetails in place of the body when it hashes the same as before
+UNCHANGED = object()
+
+# Matches HTML tags, used to build plain text notifications
+HTML_TAG_RE = re.compile(r'<[^<]+?>')
+
+# Matches the token part of Discord webhook URLs, used when masking URLs
+DISCORD_TOKEN_RE = re.compile(r'(discord://\d+/)(.+)')
+
 
 class SteamPriceMonitor:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
-        self.watched_games: Dict = {}
-        self.load_data()
+        # Recent Steam API responses keyed by (app_id, country)
+        self._price_cache: Dict[Tuple[str, str], Tuple[float, str, Dict]] = {}
+        self._fetch_locks: Dict[Tuple[str, str], asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._limiter = AsyncLimiter(STEAM_RATE_LIMIT, STEAM_RATE_PERIOD)
+        self._telegram_limiter = AsyncLimiter(TELEGRAM_RATE_LIMIT, 1)
+        # Apprise plugin instances keyed by notification URL
+        self._apprise_plugins: Dict[str, object] = {}
+        # Notifications are delivered by worker tasks started with the bot
+        self.notification_queue: Optional[asyncio.Queue] = None
+        self._notification_workers: List[asyncio.Task] = []
+        self.db = self.open_database()
+
+    def open_database(self) -> sqlite3.Connection:
+        """Open the SQLite database, creating the schema on first use"""
+        db = sqlite3.connect(DB_FILE, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(DB_SCHEMA)
+        
+        # Retried on every start until the legacy data has been imported
+        if db.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone() is None:
+            self.import_json_data(db)
+        
+        count = db.execute("SELECT COUNT(*) FROM watches").fetchone()[0]
+        logger.info(f"Loaded {count} watched games")
+        return db
 
-    def load_data(self):
-        """Load watched games from file"""
+    def import_json_data(self, db: sqlite3.Connection):
+        """Import watches and Apprise URLs from the legacy JSON data file"""
+        if not os.path.exists(DATA_FILE):
+            return
+        
+        mark_imported = "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)"
+        
+        # Never import on top of a database that is already in use
+        has_data = (
+            db.execute("SELECT 1 FROM watches LIMIT 1").fetchone() is not None or
+            db.execute("SELECT 1 FROM apprise_urls LIMIT 1").fetchone() is not None
+        )
+        if has_data:
+            db.execute(mark_imported, (datetime.now().isoformat(),))
+            return
+        
         try:
-            if os.path.exists(DATA_FILE):
-                with open(DATA_FILE, 'r') as f:
-                    self.watched_games = json.load(f)
-                logger.info(f"Loaded {len(self.watched_games)} watched games")
+            with open(DATA_FILE, 'rb') as f:
+                data = json_loads(f.read())
         except Exception as e:
-            logger.error(f"Error loading data: {e}")
-            self.watched_games = {}
-
-    def save_data(self):
-        """Save watched games to file"""
+            logger.error(f"Error importing data from {DATA_FILE}: {e}")
+            return
+        
+        if not isinstance(data, dict):
+            logger.error(f"Error importing data from {DATA_FILE}: expected a JSON object")
+            return
+        
+        watches = []
+        apprise_urls = []
+        for key, entry in data.items():
+            try:
+                if key.startswith('user_'):
+                    chat_id = entry.get('chat_id', key[len('user_'):])
+                    for url in entry.get('default_apprise_urls', []):
+                        apprise_urls.append((chat_id, url))
+                    continue
+                
+                # Validate entry has required keys
+                if (not isinstance(entry, dict) or 'chat_id' not in entry or
+                        'app_id' not in entry or 'currency' not in entry):
+                    logger.error(f"Invalid watch data for key {key}: missing required fields")
+                    continue
+                
+                # Older files stored prices as floats rather than cents
+                last_price_cents = entry.get('last_price_cents')
+                if last_price_cents is None and entry.get('last_price') is not None:
+                    last_price_cents = round(entry['last_price'] * 100)
+                
+                watches.append((
+                    entry['chat_id'],
+                    entry['app_id'],
+                    entry['currency'],
+                    last_price_cents,
+                    entry.get('last_discount'),
+                    entry.get('game_name'),
+                    entry.get('last_body_hash'),
+                    entry.get('added_at')
+                ))
+            except Exception as e:
+                logger.error(f"Invalid data for key {key}: {e}")
+        
         try:
-            with open(DATA_FILE, 'w') as f:
-                json.dump(self.watched_games, f, indent=2)
-            logger.info("Data saved successfully")
+            # The import only counts as done if its rows are committed with it
+            with self.transaction(db):
+                db.executemany(
+                    "INSERT OR IGNORE INTO watches (chat_id, app_id, currency, last_price_cents, "
+                    "last_discount, game_name, last_body_hash, added_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    watches
+                )
+                db.executemany(
+                    "INSERT OR IGNORE INTO apprise_urls (chat_id, url) VALUES (?, ?)",
+                    apprise_urls
+                )
+                db.execute(mark_imported, (datetime.now().isoformat(),))
+            logger.info(f"Imported {len(watches)} watched games from {DATA_FILE}")
         except Exception as e:
-            logger.error(f"Error saving data: {e}")
+            logger.error(f"Error importing data from {DATA_FILE}: {e}")
+
+    @staticmethod
+    @contextmanager
+    def transaction(db: sqlite3.Connection):
+        """Run a group of statements in a single transaction"""
+        db.execute("BEGIN")
+        try:
+            yield
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def close_database(self):
+        """Close the SQLite database"""
+        self.db.close()
 
     async def init_session(self):
-        """Initialize aiohttp session"""
+        """Initialize aiohttp session with a pooled, per-host limited connector"""
         if self.session is None:
-            self.session = aiohttp.ClientSession()
+            connector = aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=MAX_CONCURRENT_REQUESTS,
+                ttl_dns_cache=300,
+                keepalive_timeout=75
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=15),
+                raise_for_status=False
+            )
 
     async def close_session(self):
         """Close aiohttp session"""
@@ -70,253 +276,482 @@ class SteamPriceMonitor:
             await self.session.close()
 
     async def get_game_details(self, app_id: str, country: str = 'us') -> Optional[Dict]:
-        """Fetch game details from Steam API - WITHOUT filters to get full data"""
-        await self.init_session()
+        """Get game details, reusing a recent response for the same app and country"""
+        result = await self.get_game_response(app_id, country)
+        return result[1] if result else None
+
+    async def get_game_response(self, app_id: str, country: str = 'us') -> Optional[Tuple[str, Dict]]:
+        """Get the response body hash and game details for an app and country"""
+        key = (str(app_id), country)
         
-        url = f"https://store.steampowered.com/api/appdetails"
+        # Concurrent requests for the same key wait for a single fetch
+        async with self._fetch_locks[key]:
+            cached = self._price_cache.get(key)
+            if cached and time.monotonic() - cached[0] < PRICE_CACHE_TTL:
+                return cached[1], cached[2]
+            
+            # Pass the previous response along so an identical body isn't parsed again
+            previous = (cached[1], cached[2]) if cached else None
+            result = await self.fetch_game_details(app_id, country, previous)
+            if result:
+                self._price_cache[key] = (time.monotonic(), *result)
+            return result
+
+    async def fetch_game_details(self, app_id: str, country: str = 'us',
+                                 previous: Optional[Tuple[str, Dict]] = None) -> Optional[Tuple[str, Dict]]:
+        """Fetch game details from Steam API - WITHOUT filters to get full data"""
         params = {
             'appids': app_id,
             'cc': country,
             'l': 'english'
         }
         
-        try:
-            async with self.session.get(url, params=params, timeout=15) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # Steam API returns data with app_id as key
-                    app_id_str = str(app_id)
-                    if app_id_str in data and data[app_id_str].get('success'):
-                        game_data = data[app_id_str]['data']
-                        game_name = game_data.get('name', 'Unknown Game')
-                        logger.info(f"Successfully fetched data for app {app_id}: {game_name}")
-                        return game_data
-                    else:
-                        logger.warning(f"API returned success=false for {app_id}")
-                        if app_id_str in data:
-                            logger.debug(f"Response: {data[app_id_str]}")
-                        return None
-                else:
-                    logger.error(f"HTTP {response.status} for app {app_id}")
-                    return None
-        except asyncio.TimeoutError:
-            logger.error(f"Timeout fetching game details for {app_id}")
+        result = await self.request_appdetails(params, previous[0] if previous else None)
+        if not result:
             return None
-        except Exception as e:
-            logger.error(f"Error fetching game details for {app_id}: {e}")
+        
+        # Identical response to the last fetch, reuse the parsed data
+        body_hash, data = result
+        if data is UNCHANGED:
+            logger.debug(f"Unchanged response for app {app_id}")
+            return previous
+        
+        if not isinstance(data, dict):
+            logger.warning(f"Unexpected response for app {app_id}: {data!r}")
+            return None
+        
+        # Steam API returns data with app_id as key
+        app_id_str = str(app_id)
+        entry = data.get(app_id_str)
+        if isinstance(entry, dict) and entry.get('success'):
+            game_data = entry['data']
+            game_name = game_data.get('name', 'Unknown Game')
+            logger.info(f"Successfully fetched data for app {app_id}: {game_name}")
+            return body_hash, game_data
+        else:
+            logger.warning(f"API returned success=false for {app_id}")
+            if entry is not None:
+                logger.debug(f"Response: {entry}")
             return None
 
+    async def fetch_price_overviews(self, app_ids: List[str], country: str = 'us') -> Dict[str, Tuple[str, Dict]]:
+        """Fetch only the price data of several games in a single Steam API request"""
+        params = {
+            'appids': ','.join(app_ids),
+            'cc': country,
+            'filters': 'price_overview'
+        }
+        
+        result = await self.request_appdetails(params)
+        if not result:
+            return {}
+        
+        # Steam answers some multi-app queries with a bare null
+        data = result[1]
+        if not isinstance(data, dict):
+            logger.warning(f"Unexpected response for apps {params['appids']}: {data!r}")
+            return {}
+        
+        prices = {}
+        for app_id, entry in data.items():
+            if not isinstance(entry, dict) or not entry.get('success'):
+                logger.warning(f"API returned success=false for {app_id}")
+                continue
+            
+            # Free games come back with an empty list instead of a dict
+            game_data = entry.get('data') or {}
+            prices[app_id] = (xxhash.xxh64(json_dumps(game_data)).hexdigest(), game_data)
+        
+        logger.info(f"Successfully fetched prices for {len(prices)}/{len(app_ids)} apps ({country})")
+        return prices
+
+    async def request_appdetails(self, params: Dict,
+                                 previous_hash: Optional[str] = None) -> Optional[Tuple[str, object]]:
+        """Request the Steam appdetails endpoint, returning the body hash and parsed response.
+        
+        The response is left unparsed (UNCHANGED) when its hash matches previous_hash.
+        """
+        await self.init_session()
+        
+        url = f"https://store.steampowered.com/api/appdetails"
+        app_ids = params['appids']
+        
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with self._limiter:
+                    async with self.session.get(url, params=params) as response:
+                        if response.status == 200:
+                            body = await response.read()
+                            body_hash = xxhash.xxh64(body).hexdigest()
+                            if body_hash == previous_hash:
+                                return body_hash, UNCHANGED
+                            return body_hash, json_loads(body)
+                        elif response.status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                            delay = min(60, 2 ** attempt)
+                            logger.warning(f"HTTP {response.status} for app {app_ids}, retrying in {delay}s")
+                        else:
+                            logger.error(f"HTTP {response.status} for app {app_ids}")
+                            return None
+            except asyncio.TimeoutError:
+                logger.error(f"Timeout fetching game details for {app_ids}")
+                return None
+            except Exception as e:
+                logger.error(f"Error fetching game details for {app_ids}: {e}")
+                return None
+            
+            # Back off exponentially before retrying a rate limited request
+            await asyncio.sleep(delay)
+        
+        return None
+
     def add_watch(self, chat_id: str, app_id: str, currency: str, game_name: str = None):
         """Add a game to watch list"""
-        key = f"{chat_id}_{app_id}_{currency}"
-        
-        # Get user's default apprise URLs
-        user_key = f"user_{chat_id}"
-        apprise_urls = self.watched_games.get(user_key, {}).get('default_apprise_urls', [])
-        
-        if key not in self.watched_games:
-            self.watched_games[key] = {
-                'chat_id': chat_id,
-                'app_id': app_id,
-                'currency': currency,
-                'last_price': None,
-                'last_discount': None,
-                'game_name': game_name,
-                'apprise_urls': apprise_urls,
-                'added_at': datetime.now().isoformat()
-            }
-            self.save_data()
-            return True
-        return False
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO watches (chat_id, app_id, currency, game_name, added_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (chat_id, app_id, currency, game_name, datetime.now().isoformat())
+        )
+        return cursor.rowcount == 1
+
+    def get_watch(self, chat_id: str, app_id: str, currency: str) -> Optional[Dict]:
+        """Get a single watched game"""
+        row = self.db.execute(
+            "SELECT * FROM watches WHERE chat_id = ? AND app_id = ? AND currency = ?",
+            (chat_id, app_id, currency)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def update_watch(self, watch_data: Dict):
+        """Store the latest name and price state of a watched game"""
+        self.db.execute(
+            "UPDATE watches SET game_name = ?, last_price_cents = ?, last_discount = ?, "
+            "last_body_hash = ? WHERE chat_id = ? AND app_id = ? AND currency = ?",
+            (
+                watch_data['game_name'],
+                watch_data['last_price_cents'],
+                watch_data['last_discount'],
+                watch_data['last_body_hash'],
+                watch_data['chat_id'],
+                watch_data['app_id'],
+                watch_data['currency']
+            )
+        )
 
     def remove_watch(self, chat_id: str, app_id: str, currency: str):
         """Remove a game from watch list"""
-        key = f"{chat_id}_{app_id}_{currency}"
-        if key in self.watched_games:
-            del self.watched_games[key]
-            self.save_data()
-            return True
-        return False
+        cursor = self.db.execute(
+            "DELETE FROM watches WHERE chat_id = ? AND app_id = ? AND currency = ?",
+            (chat_id, app_id, currency)
+        )
+        return cursor.rowcount > 0
 
     def get_user_watches(self, chat_id: str) -> List[Dict]:
         """Get all watched games for a user"""
-        return [
-            data for key, data in self.watched_games.items()
-            if data.get('chat_id') == chat_id and not key.startswith('user_')
-        ]
+        rows = self.db.execute(
+            "SELECT * FROM watches WHERE chat_id = ? ORDER BY rowid",
+            (chat_id,)
+        )
+        return [dict(row) for row in rows]
+
+    def get_all_watches(self) -> List[Dict]:
+        """Get all watched games for every user"""
+        return [dict(row) for row in self.db.execute("SELECT * FROM watches")]
 
     def set_user_apprise(self, chat_id: str, urls: List[str]):
         """Set default Apprise URLs for a user"""
-        user_key = f"user_{chat_id}"
-        self.watched_games[user_key] = {
-            'chat_id': chat_id,
-            'default_apprise_urls': urls,
-            'updated_at': datetime.now().isoformat()
-        }
-        self.save_data()
+        with self.transaction(self.db):
+            self.db.execute("DELETE FROM apprise_urls WHERE chat_id = ?", (chat_id,))
+            self.db.executemany(
+                "INSERT OR IGNORE INTO apprise_urls (chat_id, url) VALUES (?, ?)",
+                [(chat_id, url) for url in urls]
+            )
 
     def get_user_apprise(self, chat_id: str) -> List[str]:
         """Get user's default Apprise URLs"""
-        user_key = f"user_{chat_id}"
-        return self.watched_games.get(user_key, {}).get('default_apprise_urls', [])
+        rows = self.db.execute(
+            "SELECT url FROM apprise_urls WHERE chat_id = ? ORDER BY rowid",
+            (chat_id,)
+        )
+        return [row['url'] for row in rows]
 
     def clear_user_apprise(self, chat_id: str):
         """Clear user's default Apprise URLs"""
-        user_key = f"user_{chat_id}"
-        if user_key in self.watched_games:
-            del self.watched_games[user_key]
-            self.save_data()
-            return True
-        return False
-
-    async def check_price_changes(self, application: Application):
-        """Check for price changes for all watched games"""
-        logger.info("Checking price changes...")
-        
-        for key, watch_data in list(self.watched_games.items()):
-            # Skip user configuration entries
-            if key.startswith('user_'):
-                continue
-            
-            # Validate watch_data has required keys
-            if 'app_id' not in watch_data or 'currency' not in watch_data:
-                logger.error(f"Invalid watch data for key {key}: missing required fields")
-                continue
-                
+        cursor = self.db.execute("DELETE FROM apprise_urls WHERE chat_id = ?", (chat_id,))
+        return cursor.rowcount > 0
+
+    def start_notification_workers(self, application: Application):
+        """Start background tasks that deliver queued notifications"""
+        self.notification_queue = asyncio.Queue()
+        self._notification_workers = [
+            asyncio.create_task(self.notification_worker(application))
+            for _ in range(NOTIFICATION_WORKERS)
+        ]
+        logger.info(f"Started {NOTIFICATION_WORKERS} notification workers")
+
+    async def stop_notification_workers(self):
+        """Deliver any queued notifications, then stop the notification worker tasks"""
+        # Prices are stored before delivery, so a dropped notification is never resent
+        if self.notification_queue is not None and self._notification_workers:
             try:
-                game_data = await self.get_game_details(
-                    watch_data['app_id'],
-                    watch_data['currency']
+                await asyncio.wait_for(self.notification_queue.join(), NOTIFICATION_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"{self.notification_queue.qsize()} notification(s) not delivered before shutdown"
                 )
-                
-                if not game_data:
-                    logger.warning(f"Could not fetch data for app {watch_data['app_id']}")
-                    continue
+        
+        for task in self._notification_workers:
+            task.cancel()
+        await asyncio.gather(*self._notification_workers, return_exceptions=True)
+        self._notification_workers = []
 
-                # ALWAYS update game name from API response
-                game_name = game_data.get('name', 'Unknown Game')
-                if watch_data.get('game_name') != game_name:
-                    watch_data['game_name'] = game_name
-                    logger.info(f"Updated game name to: {game_name}")
-                    self.save_data()
-                
-                # Check if game has price info
-                price_overview = game_data.get('price_overview')
+    async def notification_worker(self, application: Application):
+        """Deliver queued notifications to Telegram and Apprise endpoints"""
+        while True:
+            chat_id, game_name, message, apprise_urls = await self.notification_queue.get()
+            try:
+                # Send notification to Telegram
+                try:
+                    await self.send_telegram_message(application, chat_id, message)
+                    logger.info(f"Sent Telegram notification for {game_name}")
+                except Exception as e:
+                    logger.error(f"Error sending Telegram message: {e}")
                 
-                if not price_overview:
-                    # Game might be free or unavailable
-                    logger.info(f"No price info for {watch_data['game_name']} (might be free)")
-                    continue
+                # Send to Apprise endpoints if configured
+                if apprise_urls:
+                    logger.info(f"Sending Apprise notifications to {len(apprise_urls)} endpoint(s)")
+                    await self.send_apprise_notifications(apprise_urls, game_name, message)
+            except Exception as e:
+                logger.error(f"Error delivering notification for {game_name}: {e}")
+            finally:
+                self.notification_queue.task_done()
 
-                current_price = price_overview.get('final', 0) / 100  # Convert cents to currency
-                current_discount = price_overview.get('discount_percent', 0)
-                currency_symbol = price_overview.get('currency', watch_data['currency'].upper())
-                
-                logger.info(f"{watch_data['game_name']}: {currency_symbol} {current_price:.2f} ({current_discount}% off)")
-                
-                # Check for changes
-                price_changed = (watch_data['last_price'] is not None and 
-                               watch_data['last_price'] != current_price)
-                discount_changed = (watch_data['last_discount'] is not None and 
-                                  watch_data['last_discount'] != current_discount)
+    async def send_telegram_message(self, application: Application, chat_id: str, text: str):
+        """Send a Telegram message, throttled to stay under the bot-wide rate limit"""
+        async with self._telegram_limiter:
+            await application.bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                parse_mode='HTML',
+                disable_web_page_preview=True
+            )
+
+    async def check_price_changes(self):
+        """Check for price changes for all watched games"""
+        logger.info("Checking price changes...")
+        
+        # Watches without a stored name need the full game details, the rest
+        # only need prices, which Steam returns for many apps per request
+        full_checks = []
+        by_currency: Dict[str, Dict[str, List[Dict]]] = defaultdict(lambda: defaultdict(list))
+        for watch_data in self.get_all_watches():
+            if watch_data['game_name']:
+                by_currency[watch_data['currency']][watch_data['app_id']].append(watch_data)
+            else:
+                full_checks.append(watch_data)
+        
+        # Fetch everything concurrently, bounded to avoid flooding the Steam API.
+        # Each game is compared as soon as it arrives, so notifications are
+        # delivered by the workers while the remaining fetches are in flight.
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        
+        async def check(watch_data):
+            async with semaphore:
+                await self.check_game(watch_data)
+        
+        async def check_batch(country, watches_by_app):
+            try:
+                async with semaphore:
+                    prices = await self.fetch_price_overviews(list(watches_by_app), country)
+            except Exception as e:
+                logger.error(f"Error fetching prices for apps {','.join(watches_by_app)}: {e}")
+                prices = {}
+            
+            for app_id, watches in watches_by_app.items():
+                try:
+                    result = prices.get(app_id)
+                    if result is None:
+                        # Missing from the batch response, retry once with a full request
+                        async with semaphore:
+                            result = await self.get_game_response(app_id, country)
+                        if not result:
+                            logger.warning(f"Could not fetch data for app {app_id}")
+                            continue
+                except Exception as e:
+                    logger.error(f"Error checking game {app_id}: {e}")
+                    continue
                 
-                if price_changed or discount_changed or watch_data['last_price'] is None:
-                    # Prepare notification message
-                    message = self.format_notification(
-                        watch_data['game_name'],
-                        watch_data['app_id'],
-                        current_price,
-                        current_discount,
-                        watch_data['last_price'],
-                        watch_data['last_discount'],
-                        currency_symbol
-                    )
-                    
-                    # Send notification to Telegram
+                for watch_data in watches:
                     try:
-                        await application.bot.send_message(
-                            chat_id=watch_data['chat_id'],
-                            text=message,
-                            parse_mode='HTML',
-                            disable_web_page_preview=True
-                        )
-                        logger.info(f"Sent Telegram notification for {watch_data['game_name']}")
+                        await self.apply_game_response(watch_data, *result)
                     except Exception as e:
-                        logger.error(f"Error sending Telegram message: {e}")
-                    
-                    # Send to Apprise endpoints if configured
-                    apprise_urls = watch_data.get('apprise_urls', [])
-                    if apprise_urls:
-                        logger.info(f"Sending Apprise notifications to {len(apprise_urls)} endpoint(s)")
-                        await self.send_apprise_notifications(
-                            apprise_urls,
-                            watch_data['game_name'],
-                            message
-                        )
-                    
-                    # Update stored values
-                    watch_data['last_price'] = current_price
-                    watch_data['last_discount'] = current_discount
-                    self.save_data()
-                
-                # Small delay to avoid rate limiting
-                await asyncio.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"Error checking game {watch_data.get('app_id')}: {e}")
+                        logger.error(f"Error checking game {app_id}: {e}")
+        
+        tasks = [check(watch_data) for watch_data in full_checks]
+        for country, apps in by_currency.items():
+            app_ids = list(apps)
+            for i in range(0, len(app_ids), APPDETAILS_BATCH_SIZE):
+                batch = {app_id: apps[app_id] for app_id in app_ids[i:i + APPDETAILS_BATCH_SIZE]}
+                tasks.append(check_batch(country, batch))
+        
+        await asyncio.gather(*tasks)
+        
+        # Wait until every notification from this cycle has been delivered
+        await self.notification_queue.join()
+        
+        self.prune_price_cache()
+
+    def prune_price_cache(self):
+        """Drop cached responses and fetch locks for games that are no longer checked"""
+        cutoff = time.monotonic() - PRICE_CACHE_RETENTION
+        for key, cached in list(self._price_cache.items()):
+            if cached[0] < cutoff:
+                del self._price_cache[key]
+        
+        for key, lock in list(self._fetch_locks.items()):
+            if key not in self._price_cache and not lock.locked():
+                del self._fetch_locks[key]
 
-    def format_notification(self, name, app_id, current_price, current_discount, 
-                          last_price, last_discount, currency):
-        """Format price change notification"""
-        message = f"🎮 <b>{name}</b>\n"
-        message += f"Steam App ID: {app_id}\n\n"
+    async def check_game(self, watch_data: Dict):
+        """Check a single watched game for price changes"""
+        try:
+            result = await self.get_game_response(
+                watch_data['app_id'],
+                watch_data['currency']
+            )
+            if not result:
+                logger.warning(f"Could not fetch data for app {watch_data['app_id']}")
+                return
+            
+            await self.apply_game_response(watch_data, *result)
+        except Exception as e:
+            logger.error(f"Error checking game {watch_data.get('app_id')}: {e}")
+
+    async def apply_game_response(self, watch_data: Dict, body_hash: str, game_data: Dict):
+        """Process fetched game data for a watch unless it is unchanged since last time"""
+        # Nothing to compare if Steam returned the same data as last time
+        if watch_data.get('last_body_hash') == body_hash:
+            logger.info(f"No changes for {watch_data['game_name']}")
+            return
+        
+        await self.process_game_data(watch_data, game_data)
+        watch_data['last_body_hash'] = body_hash
+        self.update_watch(watch_data)
+
+    async def process_game_data(self, watch_data: Dict, game_data: Dict):
+        """Compare fetched game data against a watch and queue a notification on change"""
+        # ALWAYS update game name from API response, price-only responses have none
+        game_name = game_data.get('name')
+        if game_name and watch_data.get('game_name') != game_name:
+            watch_data['game_name'] = game_name
+            logger.info(f"Updated game name to: {game_name}")
+        
+        # Check if game has price info
+        price_overview = game_data.get('price_overview')
         
-        if last_price is None:
-            message += f"💰 Current Price: {currency} {current_price:.2f}\n"
+        if not price_overview:
+            # Game might be free or unavailable
+            logger.info(f"No price info for {watch_data['game_name']} (might be free)")
+            return
+
+        current_price_cents = price_overview.get('final', 0)
+        current_discount = price_overview.get('discount_percent', 0)
+        currency_symbol = price_overview.get('currency', watch_data['currency'].upper())
+        
+        logger.info(f"{watch_data['game_name']}: {currency_symbol} {current_price_cents / 100:.2f} ({current_discount}% off)")
+        
+        # Check for changes
+        price_changed = (watch_data['last_price_cents'] is not None and 
+                       watch_data['last_price_cents'] != current_price_cents)
+        discount_changed = (watch_data['last_discount'] is not None and 
+                          watch_data['last_discount'] != current_discount)
+        
+        if price_changed or discount_changed or watch_data['last_price_cents'] is None:
+            # Prepare notification message
+            message = self.format_notification(
+                watch_data['game_name'],
+                watch_data['app_id'],
+                current_price_cents,
+                current_discount,
+                watch_data['last_price_cents'],
+                watch_data['last_discount'],
+                currency_symbol
+            )
+            
+            # Hand off delivery to the notification workers
+            await self.notification_queue.put((
+                watch_data['chat_id'],
+                watch_data['game_name'],
+                message,
+                self.get_user_apprise(watch_data['chat_id'])
+            ))
+            
+            # Update stored values
+            watch_data['last_price_cents'] = current_price_cents
+            watch_data['last_discount'] = current_discount
+
+    def format_notification(self, name, app_id, current_price_cents, current_discount, 
+                          last_price_cents, last_discount, currency):
+        """Format price change notification, prices are given in cents"""
+        parts: List[str] = [
+            f"🎮 <b>{name}</b>\n",
+            f"Steam App ID: {app_id}\n\n"
+        ]
+        
+        if last_price_cents is None:
+            parts.append(f"💰 Current Price: {currency} {current_price_cents / 100:.2f}\n")
             if current_discount > 0:
-                message += f"🔥 Discount: {current_discount}% OFF\n"
-            message += "\n✅ Now monitoring this game!"
+                parts.append(f"🔥 Discount: {current_discount}% OFF\n")
+            parts.append("\n✅ Now monitoring this game!")
         else:
-            if current_price != last_price:
-                change = "📉 PRICE DROP" if current_price < last_price else "📈 PRICE INCREASE"
-                message += f"{change}\n"
-                message += f"Old: {currency} {last_price:.2f}\n"
-                message += f"New: {currency} {current_price:.2f}\n"
-                diff = abs(current_price - last_price)
-                message += f"Change: {currency} {diff:.2f}\n\n"
+            if current_price_cents != last_price_cents:
+                change = "📉 PRICE DROP" if current_price_cents < last_price_cents else "📈 PRICE INCREASE"
+                diff_cents = abs(current_price_cents - last_price_cents)
+                parts.append(f"{change}\n")
+                parts.append(f"Old: {currency} {last_price_cents / 100:.2f}\n")
+                parts.append(f"New: {currency} {current_price_cents / 100:.2f}\n")
+                parts.append(f"Change: {currency} {diff_cents / 100:.2f}\n\n")
             
             if current_discount != last_discount:
                 if current_discount > 0 and (last_discount == 0 or last_discount is None):
-                    message += f"🔥 NEW DISCOUNT: {current_discount}% OFF!\n"
+                    parts.append(f"🔥 NEW DISCOUNT: {current_discount}% OFF!\n")
                 elif current_discount > last_discount:
-                    message += f"🔥 BIGGER DISCOUNT: {current_discount}% OFF (was {last_discount}%)\n"
+                    parts.append(f"🔥 BIGGER DISCOUNT: {current_discount}% OFF (was {last_discount}%)\n")
                 elif current_discount == 0:
-                    message += f"⚠️ Discount ended (was {last_discount}%)\n"
+                    parts.append(f"⚠️ Discount ended (was {last_discount}%)\n")
                 else:
-                    message += f"📊 Discount: {current_discount}% OFF\n"
+                    parts.append(f"📊 Discount: {current_discount}% OFF\n")
         
-        message += f"\n🔗 <a href='https://store.steampowered.com/app/{app_id}'>View on Steam</a>"
-        return message
+        parts.append(f"\n🔗 <a href='https://store.steampowered.com/app/{app_id}'>View on Steam</a>")
+        return ''.join(parts)
 
     async def send_apprise_notifications(self, urls: List[str], title: str, message: str):
         """Send notifications via Apprise endpoints"""
         if not urls:
             return
+        
+        if apprise is None:
+            logger.warning("Apprise not installed. Install with: pip install apprise")
+            return
             
         try:
-            import apprise
             apobj = apprise.Apprise()
             
+            # Reuse plugin instances so each URL is only parsed once
             for url in urls:
-                apobj.add(url)
+                plugin = self._apprise_plugins.get(url)
+                if plugin is None:
+                    plugin = apprise.Apprise.instantiate(url)
+                    if plugin is None:
+                        logger.warning(f"Invalid Apprise URL: {mask_url(url)}")
+                        continue
+                    self._apprise_plugins[url] = plugin
+                apobj.add(plugin)
             
             # Strip HTML tags for plain text notifications
-            import re
-            plain_message = re.sub('<[^<]+?>', '', message)
+            plain_message = HTML_TAG_RE.sub('', message)
             
-            # Send notification
-            success = apobj.notify(
+            # Send notification without blocking the event loop
+            success = await apobj.async_notify(
                 body=plain_message,
                 title=f"Steam Price Alert: {title}"
             )
@@ -326,8 +761,6 @@ class SteamPriceMonitor:
             else:
                 logger.error(f"Failed to send Apprise notifications")
                 
-        except ImportError:
-            logger.warning("Apprise not installed. Install with: pip install apprise")
         except Exception as e:
             logger.error(f"Error sending Apprise notification: {e}")
 
@@ -422,8 +855,8 @@ async def watch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "You'll receive notifications when the price changes!",
             parse_mode='HTML'
         )
-        # Trigger immediate check for this game
-        await monitor.check_price_changes(context.application)
+        # Trigger immediate check for this game only
+        await monitor.check_game(monitor.get_watch(chat_id, app_id, currency))
     else:
         await status_msg.edit_text(
             f"ℹ️ You're already watching <b>{game_name}</b> in {currency.upper()}",
@@ -449,14 +882,14 @@ async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         name = watch.get('game_name', 'Loading...')
         app_id = watch['app_id']
         currency = watch['currency'].upper()
-        last_price = watch.get('last_price')
+        last_price_cents = watch.get('last_price_cents')
         discount = watch.get('last_discount', 0)
         
         message += f"🎮 <b>{name}</b>\n"
         message += f"   App ID: {app_id} | Currency: {currency}\n"
         
-        if last_price is not None:
-            message += f"   Last Price: {currency} {last_price:.2f}"
+        if last_price_cents is not None:
+            message += f"   Last Price: {currency} {last_price_cents / 100:.2f}"
             if discount > 0:
                 message += f" ({discount}% OFF)"
             message += "\n"
@@ -648,10 +1081,8 @@ async def apprise_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 def mask_url(url: str) -> str:
     """Mask sensitive parts of URLs for display"""
-    import re
-    
     # Discord webhook
-    url = re.sub(r'(discord://\d+/)(.+)', r'\1****', url)
+    url = DISCORD_TOKEN_RE.sub(r'\1****', url)
     # Generic pattern for tokens after last slash
     if '://' in url and url.count('/') > 2:
         parts = url.rsplit('/', 1)
@@ -663,11 +1094,13 @@ def mask_url(url: str) -> str:
 
 async def price_check_job(context: ContextTypes.DEFAULT_TYPE):
     """Periodic job to check price changes"""
-    await monitor.check_price_changes(context.application)
+    await monitor.check_price_changes()
 
 
 async def post_init(application: Application):
     """Initialize after bot starts"""
+    monitor.start_notification_workers(application)
+    
     # Schedule periodic price checks
     job_queue = application.job_queue
     if job_queue is not None:
@@ -682,9 +1115,16 @@ async def post_init(application: Application):
         raise RuntimeError("JobQueue is required for this bot to function")
 
 
+async def post_stop(application: Application):
+    """Flush pending notifications while the bot can still send messages"""
+    await monitor.stop_notification_workers()
+
+
 async def post_shutdown(application: Application):
     """Cleanup on shutdown"""
+    await monitor.stop_notification_workers()
     await monitor.close_session()
+    monitor.close_database()
     logger.info("Bot shutdown complete")
 
 
@@ -697,15 +1137,22 @@ def main():
         print("Please create a .env file with the following content:")
         print("\nTELEGRAM_BOT_TOKEN=your_bot_token_here")
         print("CHECK_INTERVAL=3600  # Optional: Check interval in seconds (default: 3600)")
-        print("DATA_FILE=watched_games.json  # Optional: Data file path (default: watched_games.json)")
+        print("DB_FILE=watched_games.db  # Optional: Database file path (default: watched_games.db)")
         return
     
+    # Use the faster libuv based event loop when available, this must be
+    # set before the application creates its loop
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Using uvloop event loop")
+    
     try:
         # Create application
         application = (
             Application.builder()
             .token(TELEGRAM_BOT_TOKEN)
             .post_init(post_init)
+            .post_stop(post_stop)
             .post_shutdown(post_shutdown)
             .build()
         )
@@ -721,7 +1168,7 @@ def main():
         # Start bot
         logger.info("Bot starting...")
         logger.info(f"Check interval: {CHECK_INTERVAL} seconds")
-        logger.info(f"Data file: {DATA_FILE}")
+        logger.info(f"Database file: {DB_FILE}")
         application.run_polling(allowed_updates=Update.ALL_TYPES)
         
     except RuntimeError as e: